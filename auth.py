@@ -1,4 +1,51 @@
+import base64
+import json
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+
+
+# keep-alive session per thread, so parallel logins don't contend on one
+# urllib3 pool lock
+_LOCAL = threading.local()
+
+
+def _session() -> requests.Session:
+    session = getattr(_LOCAL, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount(
+            "http://",
+            HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0),
+        )
+        _LOCAL.session = session
+    return session
+
+
+# (username, password) -> (access, refresh, exp)
+_TOKEN_CACHE: dict[tuple[str, str], tuple[str, str, float]] = {}
+_TOKEN_LOCK = threading.Lock()
+# refresh cached tokens this many seconds before they expire
+_TOKEN_EXPIRY_BUFFER = 600
+
+
+def _token_exp(token: str) -> float | None:
+    # caching is best-effort: an unreadable exp claim just skips the cache
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _auth_headers(access: str) -> dict[str, str]:
+    return {
+        "Authorization": f"Bearer {access}",
+        "Content-Type": "application/json",
+    }
 
 
 class LoginFailed(Exception):
@@ -6,17 +53,36 @@ class LoginFailed(Exception):
 
 
 class User:
-    def __init__(self, username, password="password123") -> None:
-        res = requests.post(
+    def __init__(
+        self,
+        username,
+        password="password123",
+        session: requests.Session | None = None,
+    ) -> None:
+        self.username = username
+        key = (username, password)
+        with _TOKEN_LOCK:
+            cached = _TOKEN_CACHE.get(key)
+        if cached and cached[2] - time.time() > _TOKEN_EXPIRY_BUFFER:
+            self.access, self.refresh, _ = cached
+            self.headers = _auth_headers(self.access)
+            return
+
+        session = session or _session()
+        res = session.post(
             "http://localhost:8080/auth/auth/login",
             json={"username": username, "password": password},
             timeout=10,
         )
         if res.ok:
             res = res.json()
-            self.username = username
             self.access = res["data"]["access_token"]
             self.refresh = res["data"]["refresh_token"]
+            self.headers = _auth_headers(self.access)
+            exp = _token_exp(self.access)
+            if exp is not None:
+                with _TOKEN_LOCK:
+                    _TOKEN_CACHE[key] = (self.access, self.refresh, exp)
 
         else:
             print("[login] status:", res.status_code, res.content)
@@ -24,7 +90,7 @@ class User:
 
     @staticmethod
     def register(username, password="password123") -> bool:
-        res = requests.post(
+        res = _session().post(
             "http://localhost:8080/auth/auth/register",
             json={"username": username, "password": password},
             timeout=10,
@@ -1,36 +1,83 @@
-from locust import HttpUser, task, between
+from locust import FastHttpUser, events, task, between
+from concurrent.futures import ThreadPoolExecutor
+import collections
+import itertools
+import logging
 import uuid
 import random
 import json
 import time
 
+import orjson
+
 import requests
 
 # -------------------------
 # CONFIGURATION
 # -------------------------
 
+AUTH_BASE = "http://localhost:8000/api/auth"
+
 BASE_HEADERS = {
     "Content-Type": "application/json",
 }
 
+_SESSION = requests.Session()
+
+
 def login(username):
-	auth = requests.post('http://localhost:8000',json={'username':username,'password':'password123'}).json()
-	return auth['data']['access_token']
+    auth = _SESSION.post(
+        f"{AUTH_BASE}/login",
+        json={"username": username, "password": "password123"},
+    ).json()
+    return auth["data"]["access_token"]
+
+
+SEED_USERS = ["alice", "bob", "charlie"]
 
 # Replace with real JWTs or dynamically generate them
 # Each token should represent a different user (sub)
-TOKENS = [
-    f"Bearer {login('alice')}",
-    f"Bearer {login('bob')}",
-    f"Bearer {login('charlie')}",
-]
+with ThreadPoolExecutor(max_workers=3) as ex:
+    TOKENS = [f"Bearer {t}" for t in ex.map(login, SEED_USERS)]
 
 REACTIONS = [1, 2, 3, 4, 5]
 
+# Conversations created once at test start and shared round-robin by users,
+# so ramp-up doesn't measure a burst of POST /conversations
+CONV_POOL_SIZE = 10
+CONV_POOL = []
+_conv_counter = itertools.count()
+
+
+@events.test_start.add_listener
+def prewarm_conversations(environment, **kwargs):
+    # a restarted test in the same process must not reuse earlier conversations
+    CONV_POOL.clear()
+    if not environment.host:
+        return
+
+    headers = {**BASE_HEADERS, "Authorization": TOKENS[0]}
+    for _ in range(CONV_POOL_SIZE):
+        res = _SESSION.post(
+            f"{environment.host}/conversations",
+            headers=headers,
+            json={
+                "title": f"Load Test Conversation {uuid.uuid4()}",
+                "participants": SEED_USERS,
+            },
+        )
+        if res.ok:
+            CONV_POOL.append(res.json()["name"])
+        else:
+            logging.warning(
+                "Failed to prewarm conversation: %s %s", res.status_code, res.text
+            )
+
 
-class ChatUser(HttpUser):
+class ChatUser(FastHttpUser):
     wait_time = between(1, 3)
+    network_timeout = 10.0
+    connection_timeout = 5.0
 
     def on_start(self):
         """
@@ -45,7 +92,13 @@ class ChatUser(HttpUser):
         self.conversation_name = None
         self.message_ids = []
 
-        self.create_conversation()
+        self._rng = random.Random()
+        self._react_pool = collections.deque()
+
+        if CONV_POOL:
+            self.use_conversation(CONV_POOL[next(_conv_counter) % len(CONV_POOL)])
+        else:
+            self.create_conversation()
 
     # -------------------------
     # HELPERS
@@ -65,11 +118,25 @@ class ChatUser(HttpUser):
         ) as response:
             if response.status_code == 200:
                 data = response.json()
-                self.conversation_name = data["name"]
+                self.use_conversation(data["name"])
                 response.success()
             else:
                 response.failure(f"Failed to create conversation: {response.text}")
 
+    def use_conversation(self, name):
+        self.conversation_name = name
+        self._conv_url = f"/conversations/{name}"
+        self._msgs_url = f"{self._conv_url}/messages"
+        self._msgs_page_url = f"{self._msgs_url}?limit=20&offset=0"
+
+    def random_message_id(self):
+        return self.message_ids[self._rng.randrange(len(self.message_ids))]
+
+    def random_reaction(self):
+        if not self._react_pool:
+            self._react_pool.extend(self._rng.choices(REACTIONS, k=1024))
+        return self._react_pool.pop()
+
     # -------------------------
     # TASKS
     # -------------------------
@@ -88,7 +155,7 @@ class ChatUser(HttpUser):
             return
 
         self.client.get(
-            f"/conversations/{self.conversation_name}",
+            self._conv_url,
             headers=self.headers,
             name="GET /conversations/{name}",
         )
@@ -98,15 +165,14 @@ class ChatUser(HttpUser):
         if not self.conversation_name:
             return
 
-        payload = {
-            "text": f"Hello from Locust at {time.time()}",
-            "reply_to": None,
-        }
+        body = orjson.dumps(
+            {"text": f"Hello from Locust at {time.time()}", "reply_to": None}
+        )
 
         with self.client.post(
-            f"/conversations/{self.conversation_name}/messages",
+            self._msgs_url,
             headers=self.headers,
-            json=payload,
+            data=body,
             name="POST /conversations/{name}/messages",
             catch_response=True,
         ) as response:
@@ -123,7 +189,7 @@ class ChatUser(HttpUser):
             return
 
         self.client.get(
-            f"/conversations/{self.conversation_name}/messages?limit=20&offset=0",
+            self._msgs_page_url,
             headers=self.headers,
             name="GET /conversations/{name}/messages",
         )
@@ -133,8 +199,8 @@ class ChatUser(HttpUser):
         if not self.message_ids:
             return
 
-        msg_id = random.choice(self.message_ids)
-        reaction = random.choice(REACTIONS)
+        msg_id = self.random_message_id()
+        reaction = self.random_reaction()
 
         self.client.get(
             f"/messages/{msg_id}/react/{reaction}",
@@ -147,7 +213,7 @@ class ChatUser(HttpUser):
         if not self.message_ids:
             return
 
-        msg_id = random.choice(self.message_ids)
+        msg_id = self.random_message_id()
 
         self.client.get(
             f"/messages/{msg_id}/mark_as_read",
@@ -160,7 +226,7 @@ class ChatUser(HttpUser):
         if not self.message_ids:
             return
 
-        msg_id = random.choice(self.message_ids)
+        msg_id = self.random_message_id()
 
         self.client.get(
             f"/messages/{msg_id}/receipts",
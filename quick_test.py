@@ -3,20 +3,37 @@
 Quick test script for the Chat API
 """
 
+import contextlib
 import requests
 import json
 import sys
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 class QuickTester:
     def __init__(self):
         self.auth_url = "http://localhost:8000"
         self.api_url = "http://localhost:8080"
         self.tokens = {}
+
+        # one keep-alive session per host
+        self.auth = requests.Session()
+        self.api = requests.Session()
+        for session in (self.auth, self.api):
+            session.mount(
+                "http://",
+                HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.2))
+            )
+    
+    def close(self):
+        """Close both HTTP sessions"""
+        self.auth.close()
+        self.api.close()
     
     def login(self, username="alice", password="password123"):
         """Quick login helper"""
         try:
-            response = requests.post(
+            response = self.auth.post(
                 f"{self.auth_url}/api/auth/login",
                 json={"username": username, "password": password}
             )
@@ -50,7 +67,7 @@ class QuickTester:
             "title": "Quick Test Chat"
         }
         
-        response = requests.post(
+        response = self.api.post(
             f"{self.api_url}/conversations",
             json=conv_data,
             headers=headers
@@ -63,7 +80,7 @@ class QuickTester:
             
             # Post a message
             msg_data = {"text": "Hello Bob!"}
-            response = requests.post(
+            response = self.api.post(
                 f"{self.api_url}/conversations/{conv_name}/messages",
                 json=msg_data,
                 headers=headers
@@ -75,7 +92,7 @@ class QuickTester:
                 print(f"❌ Failed to post message: {response.text}")
             
             # Get messages
-            response = requests.get(
+            response = self.api.get(
                 f"{self.api_url}/conversations/{conv_name}/messages",
                 headers=headers,
                 params={"limit": 10}
@@ -88,7 +105,7 @@ class QuickTester:
                 print(f"❌ Failed to get messages: {response.text}")
             
             # List conversations
-            response = requests.get(
+            response = self.api.get(
                 f"{self.api_url}/conversations",
                 headers=headers
             )
@@ -108,23 +125,22 @@ class QuickTester:
         
         try:
             # Check auth service
-            response = requests.get(f"{self.auth_url}/health", timeout=2)
+            response = self.auth.get(f"{self.auth_url}/health", timeout=2)
             print(f"✅ Auth service: {response.status_code}")
         except:
             print("❌ Auth service not reachable")
         
         try:
             # Check chat API
-            response = requests.get(f"{self.api_url}/health", timeout=2)
+            response = self.api.get(f"{self.api_url}/health", timeout=2)
             print(f"✅ Chat API: {response.status_code}")
         except:
             print("❌ Chat API not reachable")
             print("Note: Add a /health endpoint to your Rust app for this check")
 
 if __name__ == "__main__":
-    tester = QuickTester()
-    
-    if len(sys.argv) > 1 and sys.argv[1] == "check":
-        tester.check_services()
-    else:
-        tester.test_basic_flow()
+    with contextlib.closing(QuickTester()) as tester:
+        if len(sys.argv) > 1 and sys.argv[1] == "check":
+            tester.check_services()
+        else:
+            tester.test_basic_flow()
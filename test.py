@@ -1,7 +1,9 @@
 import asyncio
-import json
+import collections
+import functools
+import orjson
 import time
-import uuid
+import secrets
 import requests
 import websockets
 
@@ -15,6 +17,8 @@ WS_URL = "ws://127.0.0.1:8080/ws/"
 
 HEADERS_JSON = {"Content-Type": "application/json"}
 
+SESSION = requests.Session()
+
 # =========================
 # AUTH HELPERS
 # =========================
@@ -24,7 +28,7 @@ def register_user(username, password):
         "username": username,
         "password": password
     }
-    r = requests.post(
+    r = SESSION.post(
         f"{AUTH_BASE}/register",
         headers=HEADERS_JSON,
         json=payload
@@ -37,13 +41,13 @@ def login_user(username, password):
         "username": username,
         "password": password
     }
-    r = requests.post(
+    r = SESSION.post(
         f"{AUTH_BASE}/login",
         headers=HEADERS_JSON,
         json=payload
     )
     r.raise_for_status()
-    return r.json()["data"]["access_token"]
+    return orjson.loads(r.content)["data"]["access_token"]
 
 # =========================
 # REST HELPERS
@@ -55,52 +59,51 @@ def auth_headers(token):
         "Content-Type": "application/json"
     }
 
-def create_conversation(token, participants, title="Test Chat"):
+def create_conversation(post, participants, title="Test Chat"):
     payload = {
         "title": title,
         "participants": participants
     }
-    r = requests.post(
+    r = post(
         f"{MSG_BASE}/conversations",
-        headers=auth_headers(token),
         json=payload
     )
     r.raise_for_status()
-    return r.json()["name"]
+    return orjson.loads(r.content)["name"]
 
-def post_message(token, conversation, text):
+def post_message(post, conversation, text):
     payload = {"text": text}
-    r = requests.post(
+    r = post(
         f"{MSG_BASE}/conversations/{conversation}/messages",
-        headers=auth_headers(token),
         json=payload
     )
     r.raise_for_status()
-    return r.json()
+    return orjson.loads(r.content)
 
-def get_messages(token, conversation):
-    r = requests.get(
-        f"{MSG_BASE}/conversations/{conversation}/messages",
-        headers=auth_headers(token)
+def get_messages(get, conversation):
+    r = get(
+        f"{MSG_BASE}/conversations/{conversation}/messages"
     )
     r.raise_for_status()
-    return r.json()
+    return orjson.loads(r.content)
 
 # =========================
 # WEBSOCKET CLIENT
 # =========================
 
-async def ws_client(user, token, inbox):
+async def ws_client(user, token, inbox, connected=None):
     headers = {
         "Authorization": f"Bearer {token}"
     }
 
     async with websockets.connect(WS_URL, additional_headers=headers) as ws:
         print(f"[WS] {user} connected")
+        if connected is not None:
+            connected.set_result(ws)
 
         async def receiver():
             async for msg in ws:
-                data = json.loads(msg)
+                data = orjson.loads(msg)
                 print(f"[WS] {user} received:", data)
                 inbox.append(data)
 
@@ -112,40 +115,50 @@ async def ws_client(user, token, inbox):
 
 async def main():
     # Unique users per run
-    user_a = f"user_a_{uuid.uuid4().hex[:6]}"
-    user_b = f"user_b_{uuid.uuid4().hex[:6]}"
+    user_a = f"user_a_{secrets.token_hex(3)}"
+    user_b = f"user_b_{secrets.token_hex(3)}"
     password = "password123"
 
     print("🔐 Registering users...")
-    register_user(user_a, password)
-    register_user(user_b, password)
+    await asyncio.gather(
+        asyncio.to_thread(register_user, user_a, password),
+        asyncio.to_thread(register_user, user_b, password),
+    )
 
     print("🔑 Logging in...")
-    token_a = login_user(user_a, password)
-    token_b = login_user(user_b, password)
+    token_a, token_b = await asyncio.gather(
+        asyncio.to_thread(login_user, user_a, password),
+        asyncio.to_thread(login_user, user_b, password),
+    )
+    headers_a = auth_headers(token_a)
+    post_a = functools.partial(SESSION.post, headers=headers_a)
+    get_a = functools.partial(SESSION.get, headers=headers_a)
 
     print("💬 Creating conversation...")
     conversation = create_conversation(
-        token_a,
+        post_a,
         participants=[user_b],
         title="WS Test"
     )
 
-    inbox_a = []
-    inbox_b = []
+    inbox_a = collections.deque(maxlen=4096)
+    inbox_b = collections.deque(maxlen=4096)
 
     print("📡 Connecting WebSockets...")
     ws_task_a = asyncio.create_task(ws_client(user_a, token_a, inbox_a))
-    ws_task_b = asyncio.create_task(ws_client(user_b, token_b, inbox_b))
+    ws_b_connected = asyncio.get_running_loop().create_future()
+    ws_task_b = asyncio.create_task(
+        ws_client(user_b, token_b, inbox_b, ws_b_connected)
+    )
 
     await asyncio.sleep(1)
 
     print("✉️ Sending REST → WS message...")
-    post_message(token_a, conversation, "Hello from REST")
+    post_message(post_a, conversation, "Hello from REST")
 
     await asyncio.sleep(1)
 
-    assert any("Hello from REST" in m["text"] for m in inbox_b), \
+    assert any("Hello from REST" in m.get("text", "") for m in inbox_b), \
         "❌ REST → WS delivery failed"
 
     print("✉️ Sending WS → REST message...")
@@ -155,14 +168,11 @@ async def main():
         "content": "Hello from WS"
     }
 
-    async with websockets.connect(
-        WS_URL,
-        additional_headers={"Authorization": f"Bearer {token_b}"}
-    ) as ws:
-        await ws.send(json.dumps(ws_payload))
-        await asyncio.sleep(1)
+    ws_b = await ws_b_connected
+    await ws_b.send(orjson.dumps(ws_payload).decode())
+    await asyncio.sleep(1)
 
-    messages = get_messages(token_a, conversation)
+    messages = get_messages(get_a, conversation)
     assert any("Hello from WS" in m["text"] for m in messages), \
         "❌ WS → REST persistence failed"
 
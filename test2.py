@@ -1,153 +1,256 @@
+import asyncio
+import itertools
+import aiohttp
+import orjson
 import requests
-import websocket
-from time import sleep, time
-import uuid
-from json import loads
+import requests.adapters
+import uvloop
+import websockets
+from yarl import URL
+from time import perf_counter, sleep
+import secrets
+from collections import deque
 from auth import User
 
 
 MSG_BASE = "http://127.0.0.1:8080/messages"
 WS_URL = "ws://127.0.0.1:8080/messages/ws/"
 CONCURRENT_CONNECTIONS = 12
+ASYNC_CONCURRENCY = 64
+DELIVERY_TIMEOUT = 5
 # -----------------------------
 # Helpers
 # -----------------------------
 
-from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
 
 
 # timer utility
 class Timer:
     def __init__(self) -> None:
-        self.start = time()
+        self.start = perf_counter()
 
     @property
     def value(self) -> float:
-        return time() - self.start
-
-
-class WorkPool:
-    def __init__(self, nworkers, handler, work: list = []) -> None:
-        self.handler = handler
-        self.nworkers = nworkers
-        self.proceed = False
-        self._outputs: list[tuple] = [None for i in work]  # type: ignore
-        self.threads: list[Thread] = []
-        self.work: list = work
-
-    def worker_handler(self):
-        while self.proceed and len(self.work) > 0:
-            i = len(self.work)
-            inp = self.work.pop()
-            self._outputs[i - 1] = (inp, self.handler(*inp))
-
-    def resume(self):
-        if not self.proceed:
-            self.threads = [
-                Thread(target=self.worker_handler) for i in range(self.nworkers)
-            ]
-            self.proceed = True
-            for th in self.threads:
-                th.start()
-
-    def start(self):
-        self.resume()
-        return self
-
-    @property
-    def output(self):
-        return self._outputs
-
-    def pause(self):
-
-        self.proceed = False
-        for th in self.threads:
-            th.join()
-
-    def wait(self):
-        for th in self.threads:
-            th.join()
+        return perf_counter() - self.start
+
+
+class Inbox:
+    def __init__(self, maxlen=4096) -> None:
+        self.maxlen = maxlen
+        self.messages: deque = deque(maxlen=maxlen)
+        # insertion-ordered, capped at maxlen like messages
+        self.texts: dict[str, None] = {}
+        self.received = 0
+        self._lock = Lock()
+        self._waiters: dict[str, Event] = {}
+
+    def append(self, message):
+        text = message.get("text") or ""
+        self.messages.append(message)
+        self.received += 1
+        with self._lock:
+            self.texts.pop(text, None)
+            self.texts[text] = None
+            if len(self.texts) > self.maxlen:
+                del self.texts[next(iter(self.texts))]
+            matched = [w for w in self._waiters if w in text]
+            waiters = [self._waiters.pop(w) for w in matched]
+        for waiter in waiters:
+            waiter.set()
+
+    def _seen(self, text) -> bool:
+        # exact hit is O(1); otherwise fall back to a substring scan
+        return text in self.texts or any(text in t for t in self.texts)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def wait_for(self, text, timeout=DELIVERY_TIMEOUT) -> bool:
+        """block until a message containing this text arrives, or timeout"""
+        with self._lock:
+            if self._seen(text):
+                return True
+            waiter = self._waiters.setdefault(text, Event())
+        delivered = False
+        try:
+            delivered = waiter.wait(timeout)
+            return delivered
+        finally:
+            if not delivered:
+                with self._lock:
+                    if self._waiters.get(text) is waiter:
+                        del self._waiters[text]
+
+    def __repr__(self) -> str:
+        return f"Inbox({list(self.messages)})"
+
+
+def poll(fetch, timeout=DELIVERY_TIMEOUT, interval=0.1):
+    """call fetch until it returns something non-empty, or timeout"""
+    deadline = perf_counter() + timeout
+    while True:
+        result = fetch()
+        if result or perf_counter() >= deadline:
+            return result
+        sleep(interval)
+
+
+def user_session(user: User) -> requests.Session:
+    session = requests.Session()
+    # one host, so one cached pool with a socket per concurrent caller
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=CONCURRENT_CONNECTIONS * 2,
+        max_retries=0,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(user.headers)
+    # fail fast on a bad URL instead of silently following a redirect
+    session.max_redirects = 0
+    return session
 
 
 def user(name):
-    return {"username": f"{name}_{uuid.uuid4().hex[:6]}", "password": "password123"}
+    return {"username": f"{name}_{secrets.token_hex(3)}", "password": "password123"}
 
 
-def create_conversation(session, token, participants):
+def create_conversation(session, participants):
     with session.post(
         f"{MSG_BASE}/conversations",
         json={"participants": participants},
-        headers={"Authorization": f"Bearer {token}"},
     ) as r:
-        return (r.json())["name"]
+        return orjson.loads(r.content)["name"]
 
 
-def send_message(session, token, conv, text):
+def send_message(session, conv, text):
     session.post(
         f"{MSG_BASE}/conversations/{conv}/messages",
-        json={"text": text},
-        headers={"Authorization": f"Bearer {token}"},
+        data=orjson.dumps({"text": text}),
     )
 
 
-def send_pmessage(session, token, peer, text):
+async def run_load(headers, conv, count) -> tuple[int, int, int]:
+    # every send replays the same parsed URL and encoded body
+    url = URL(f"{MSG_BASE}/conversations/{conv}/messages")
+    body = orjson.dumps({"text": f"Hello for the th time"})
+    sem = asyncio.Semaphore(ASYNC_CONCURRENCY)
+    connector = aiohttp.TCPConnector(
+        limit=ASYNC_CONCURRENCY * 2, keepalive_timeout=60, ttl_dns_cache=300
+    )
+    # a request over this bound is reported as a timed-out failed send
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(
+        connector=connector, headers=headers, timeout=timeout
+    ) as session:
+
+        sent = itertools.count(1)
+
+        # invariants bound as defaults: fast locals instead of closure/attr lookups
+        async def send(post=session.post, url=url, body=body, tick=sent.__next__):
+            async with sem:
+                async with post(url, data=body) as r:
+                    await r.read()
+                    if r.ok:
+                        tick()
+
+        tasks = [asyncio.create_task(send()) for _ in range(count)]
+        # a failed send is counted, not allowed to abort the whole run
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    sent = next(sent) - 1
+    timed_out = sum(isinstance(r, asyncio.TimeoutError) for r in results)
+    return sent, count - sent, timed_out
+
+
+def send_pmessage(session, peer, text):
     session.post(
         f"{MSG_BASE}/inbox/{peer}/messages",
-        json={"text": text},
-        headers={"Authorization": f"Bearer {token}"},
+        data=orjson.dumps({"text": text}),
     )
 
 
-def fetch_messages(session, token, conv=None, peer=None):
+def fetch_messages(session, conv=None, peer=None):
     if conv:
         with session.get(
             f"{MSG_BASE}/conversations/{conv}/messages",
-            headers={"Authorization": f"Bearer {token}"},
         ) as r:
-            return r.json()
+            return orjson.loads(r.content)
 
     if peer:
         with session.get(
             f"{MSG_BASE}/inbox/messages",
-            headers={"Authorization": f"Bearer {token}"},
             params={"source": peer},
         ) as r:
-            return r.json()
+            return orjson.loads(r.content)
 
 
-def fetch_pmessages(session, token, conv):
-    with session.get(
-        f"{MSG_BASE}//{conv}/messages",
-        headers={"Authorization": f"Bearer {token}"},
-    ) as r:
-        return r.json()
+def fetch_pmessages(session, conv):
+    return fetch_messages(session, peer=conv)
 
 
-def fetch_receipts(session: requests.Session, token, message):
+def fetch_receipts(session: requests.Session, message):
     with session.get(
         f"{MSG_BASE}/messages/{message}/receipts",
-        headers={"Authorization": f"Bearer {token}"},
     ) as r:
-        return r.json()
-
-
-def ws_client(user: User, handler):
-    def on_message(ws, message):
-        print(message)
-        handler(loads(message))
-
-    def on_connect(ws):
-        print("connected", user.username)
-
-    ws = websocket.WebSocketApp(
-        WS_URL,
-        header={"Authorization": f"Bearer {user.access}"},
-        on_error=print,
-        on_message=on_message,
-        on_open=on_connect,
-    )
-
-    ws.run_forever()
+        return orjson.loads(r.content)
+
+
+def drain_batch(batch: list, queue: asyncio.Queue, handler):
+    while not queue.empty():
+        batch.append(queue.get_nowait())
+    if batch:
+        messages = [orjson.loads(m) for m in batch]
+        print(messages)
+        handler(messages)
+
+
+async def ws_client(user: User, handler):
+    # the receiver only enqueues frames; a drainer hands them to handler in batches
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def drain():
+        while True:
+            batch = [await queue.get()]
+            # a bad frame or handler error drops this batch, not the drainer
+            try:
+                drain_batch(batch, queue, handler)
+            except Exception as e:
+                print(e)
+
+    drainer = asyncio.create_task(drain())
+    try:
+        async with websockets.connect(
+            WS_URL,
+            additional_headers=user.headers,
+            max_size=None,
+            compression=None,
+            ping_interval=None,
+        ) as ws:
+            print("connected", user.username)
+            while True:
+                # raw frame bytes go straight to orjson, no str decode
+                queue.put_nowait(await ws.recv(decode=False))
+    except websockets.ConnectionClosedOK:
+        pass
+    except Exception as e:
+        print(e)
+    finally:
+        drainer.cancel()
+        try:
+            drain_batch([], queue, handler)
+        except Exception as e:
+            print(e)
+
+
+def run_ws_loop(users: list[User], handlers):
+    # every connection shares one event loop instead of a thread each
+    async def run_all():
+        await asyncio.gather(*[ws_client(u, h) for u, h in zip(users, handlers)])
+
+    uvloop.run(run_all())
 
 
 # -----------------------------
@@ -156,30 +259,23 @@ def ws_client(user: User, handler):
 
 
 if __name__ == "__main__":
-    session = requests.Session()
-
     names = ["alice", "bob", "carol", "diana", "elvis", "felix"]
-    names = [f"{name}_{uuid.uuid4().hex[:6]}" for name in names]
+    names = [f"{name}_{secrets.token_hex(3)}" for name in names]
     users: list[str] = [user(name) for name in names]  # type: ignore
-    print("🔐 Registering users...")
-    work = [(u,) for u in names]
-    wp = WorkPool(10, User.register, work)
-    wp.start()
-    wp.wait()
-
-    work = [inp for inp, out in wp.output]
-    print("🔑 Logging in...")
-    wp = WorkPool(len(work), User, work)
-    wp.start().wait()
-    users: list[User] = [out for inp, out in wp.output]
-    inboxes: list[list] = [[] for i in users]
+    with ThreadPoolExecutor(max_workers=CONCURRENT_CONNECTIONS) as ex:
+        print("🔐 Registering users...")
+        list(ex.map(User.register, names))
+
+        print("🔑 Logging in...")
+        users: list[User] = list(ex.map(User, names))
+    sessions = [user_session(u) for u in users]
+    inboxes: list[Inbox] = [Inbox() for i in users]
 
     print("📡 Connecting WebSockets...")
-    usrs = [u for u in users]
-    WorkPool(
-        len(users),
-        ws_client,
-        [(u, t.append) for u, t in zip(usrs, inboxes)],
+    Thread(
+        target=run_ws_loop,
+        args=(users, [t.extend for t in inboxes]),
+        daemon=True,
     ).start()
     print(users)
 
@@ -187,59 +283,49 @@ if __name__ == "__main__":
     # Peer-to-peer
     # -----------------------------
     print("💬 Testing P2P conversation...")
-    # conv_p2p = create_conversation(session, users[0].access, [users[1].username])
-    send_pmessage(session, users[0].access, users[1].username, "P2P hello")
-    sleep(2)
+    # conv_p2p = create_conversation(sessions[0], [users[1].username])
+    send_pmessage(sessions[0], users[1].username, "P2P hello")
+    assert inboxes[1].wait_for("P2P hello")
     print(inboxes)
-    history = fetch_messages(session, users[0].access, peer=users[1].username)
+    # live delivery doesn't wait for the DB write, so poll until it is persisted
+    history = poll(lambda: fetch_messages(sessions[0], peer=users[1].username))
+    assert history
     print(inboxes[1])
-    assert any("P2P hello" in m["text"] for m in inboxes[1])
     print("✅ P2P OK")
     print("Testing message receipts")
-    receipts = fetch_receipts(session, users[0].access, history[0]["id"])
+    receipts = poll(lambda: fetch_receipts(sessions[0], history[0]["id"]))
     print(receipts)
 
     # -----------------------------
     # Group chat
     # -----------------------------
     print("👥 Testing group chat...")
-    conv_group = create_conversation(
-        session, users[0].access, [u.username for u in users]
-    )
+    conv_group = create_conversation(sessions[0], [u.username for u in users])
 
-    send_message(session, users[1].access, conv_group, "Hello group")
-    sleep(1)
-    print(inboxes)
+    send_message(sessions[1], conv_group, "Hello group")
     for inbox in inboxes:
-        if inbox != inboxes[1]:
-            assert any("Hello group" in m["text"] for m in inbox)
+        if inbox is not inboxes[1]:
+            assert inbox.wait_for("Hello group")
+    print(inboxes)
 
-    history = fetch_messages(session, users[-1].access, conv=conv_group)
+    history = fetch_messages(sessions[-1], conv=conv_group)
     # assert any("Hello group" in m["text"] for m in history)
 
     print("✅ Group chat OK")
 
     print("Testing load capacity")
 
-    msgs = 0
-
-    def func():
-        global msgs
-        send_message(session, users[0].access, conv_group, f"Hello for the th time")
-        msgs += 1
-
     timer = Timer()
-    thds = []
-    wp = WorkPool(CONCURRENT_CONNECTIONS, func, [() for i in range(900)]).start()
-    wp.wait()
+    msgs, failed, timed_out = uvloop.run(run_load(users[0].headers, conv_group, 900))
 
     print(
         f"took {timer.value} seconds to send {msgs} messages: {msgs/timer.value} req/sec"
     )
+    print(f"{failed} sends failed ({timed_out} timed out)")
     print(
-        f"received {len(inboxes[1])} messages in {timer.value} seconds: {len(inboxes[1])/timer.value} msgs/sec"
+        f"received {inboxes[1].received} messages in {timer.value} seconds: {inboxes[1].received/timer.value} msgs/sec"
     )
     sleep(2)
-    history = fetch_messages(session, users[-1].access, conv_group)
+    history = fetch_messages(sessions[-1], conv_group)
     print(f"written {len(history)} messages in {timer.value} seconds")
     print("\n🎉 ALL MESSAGE TESTS PASSED")
@@ -1,5 +1,6 @@
 import requests
-from time import time
+from requests.adapters import HTTPAdapter
+from time import perf_counter
 
 
 AUTH_BASE = "http://localhost:8000/api/auth"
@@ -10,19 +11,23 @@ WS_URL = "ws://127.0.0.1:8080/ws/"
 # timer utility
 class Timer:
     def __init__(self) -> None:
-        self.start = time()
+        self.start = perf_counter()
 
     @property
     def value(self) -> float:
-        return time() - self.start
+        return perf_counter() - self.start
 
-login = requests.post(AUTH_BASE+'/login',json={'username':'alice','password':'password123'}).json()
+s = requests.Session()
+s.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=16))
+
+login = s.post(AUTH_BASE+'/login',json={'username':'alice','password':'password123'}).json()
 token = login['data']['access_token']
+s.headers.update({"AUTHORIZATION": f"Bearer {token}"})
 
 timer = Timer()
 for i in range(1000):
 
-    requests.post(
+    s.post(
         MSG_BASE + "/conversations",
         json={
             "name": "failed",
@@ -30,7 +35,6 @@ for i in range(1000):
             "title": "my failed title",
         },
         timeout=10,
-        headers={"AUTHORIZATION": f"Bearer {token}"},
     )
 
 